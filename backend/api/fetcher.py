@@ -5,18 +5,49 @@ robots.txtのチェックを行い、許可されている場合のみHTMLを取
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import Optional
+import asyncio
 import requests
+from requests.compat import chardet
+from email.message import Message
 from urllib.parse import urlparse
-from .robots_checker import check_url_allowed, get_robots_url, fetch_robots_txt
-from .html_parser import sanitize_html
-from bs4 import BeautifulSoup
+from .robots_checker import (
+    DEFAULT_USER_AGENT,
+    check_url_allowed,
+    create_session,
+    get_parser,
+)
+from .html_parser import detect_encoding, sanitize_html
 
 router = APIRouter()
 
+# モジュール共有のセッション（接続を再利用する）
+_session = create_session()
+
+# 文字コード自動推定（apparent_encoding相当）に使う最大バイト数
+APPARENT_ENCODING_BYTES = 64 * 1024
+
+
+def get_response_encoding(response: requests.Response) -> Optional[str]:
+    """
+    レスポンスのエンコーディングを判定する
+    
+    バイトオーダーマーク、Content-Typeのcharset、<meta charset>の順に確認し、
+    いずれも無い場合のみ先頭APPARENT_ENCODING_BYTESバイトから推定する
+    """
+    message = Message()
+    message['content-type'] = response.headers.get('content-type', '')
+    declared = message.get_content_charset()
+    
+    encoding = detect_encoding(declared, response.content, default=None)
+    if encoding is None:
+        encoding = chardet.detect(response.content[:APPARENT_ENCODING_BYTES])['encoding']
+    return encoding
+
 
 class FetchHtmlRequest(BaseModel):
     url: str
-    user_agent: str = "FlexibleScrapingTool/1.0"
+    user_agent: str = DEFAULT_USER_AGENT
 
 
 class FetchHtmlResponse(BaseModel):
@@ -35,10 +66,10 @@ async def fetch_html(request: FetchHtmlRequest):
     robots.txtで禁止されている場合はエラーを返す
     """
     try:
-        # 1. robots.txt チェック
-        robots_url = get_robots_url(request.url)
-        robots_content = fetch_robots_txt(robots_url)
-        allowed = check_url_allowed(robots_content, request.url, request.user_agent)
+        # 1. robots.txt チェック（ホストごとにキャッシュ済みのパーサーを使用）
+        # ブロッキングI/Oはイベントループを止めないよう別スレッドで実行する
+        robots_parser = await asyncio.to_thread(get_parser, request.url)
+        allowed = check_url_allowed(robots_parser, request.url, request.user_agent)
 
         if not allowed:
             raise HTTPException(
@@ -48,18 +79,19 @@ async def fetch_html(request: FetchHtmlRequest):
 
         # 2. HTML取得
         headers = {"User-Agent": request.user_agent}
-        response = requests.get(request.url, headers=headers, timeout=30)
+        response = await asyncio.to_thread(
+            _session.get, request.url, headers=headers, timeout=30
+        )
         response.raise_for_status()
         
-        # エンコーディングの自動検出と設定
-        response.encoding = response.apparent_encoding
+        # エンコーディング（BOM・charset・<meta charset>の順）を判定し、バイト列のまま渡す
+        # （指定エンコーディングとして不正なバイトは置換してデコードされる）
+        encoding = get_response_encoding(response)
 
-        # 3. HTMLサニタイズ
-        sanitized_html, has_scripts = sanitize_html(response.text)
-        
-        # 4. 要素数カウント
-        soup = BeautifulSoup(sanitized_html, 'lxml')
-        elements_count = len(soup.find_all(True))
+        # 3. HTMLサニタイズ（要素数も同時にカウント）
+        sanitized_html, has_scripts, elements_count = await asyncio.to_thread(
+            sanitize_html, response.content, encoding
+        )
 
         return FetchHtmlResponse(
             url=request.url,
@@ -1,11 +1,17 @@
 """
 HTML解析API
-BeautifulSoup4を使用してHTMLを解析し、安全なHTMLを返却する
+lxmlを使用してHTMLを解析し、安全なHTMLを返却する
 """
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from bs4 import BeautifulSoup
+from lxml import etree
+from lxml.cssselect import CSSSelector
+from lxml.html import HTMLParser, document_fromstring, tostring
+from lxml.html.clean import Cleaner
+from typing import Iterable, Optional, Union
+import codecs
+import functools
 import re
 
 router = APIRouter()
@@ -29,67 +35,237 @@ class ElementInfoRequest(BaseModel):
     selector: str
 
 
-def sanitize_html(html: str) -> tuple[str, bool]:
+_DOCTYPE_RE = re.compile(r'\s*(<\?xml[^>]*\?>\s*)?<!doctype', re.IGNORECASE)
+
+# 文字列入力の先頭にあるXML宣言（lxmlはエンコーディング宣言付きの文字列を解析できない）
+_XML_DECL_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+# <meta charset> を探す範囲（先頭バイト数）
+SNIFF_BYTES = 2048
+
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+# バイトオーダーマークとそのエンコーディング（UTF-32はUTF-16より先に判定する）
+_BOM_ENCODINGS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+class _ScriptCleaner(Cleaner):
+    """
+    スクリプトのみを除去するCleaner
+    
+    javascript=True の場合、lxmlは <link rel="stylesheet"> も除去するため、
+    スタイルシートのリンクは残す（href の javascript: スキームは別途除去される）
+    """
+    
+    def allow_element(self, el):
+        if el.tag == 'link' and 'stylesheet' in el.get('rel', '').lower():
+            return True
+        return super().allow_element(el)
+
+
+# スクリプトとJavaScriptのみを除去し、それ以外の構造・属性は保持する
+_CLEANER = _ScriptCleaner(
+    scripts=True,
+    javascript=True,
+    comments=False,
+    style=False,
+    inline_style=False,
+    links=False,
+    meta=False,
+    page_structure=False,
+    processing_instructions=False,
+    embedded=False,
+    frames=False,
+    forms=False,
+    annoying_tags=False,
+    remove_unknown_tags=False,
+    safe_attrs_only=False,
+)
+
+
+def parse_html_chunks(chunks: Iterable[bytes], encoding: Optional[str] = None):
+    """
+    バイト列のHTMLをチャンクごとにデコードしてlxmlへ渡して解析する
+    
+    デコードはlxml（libxml2）ではなくPython側で行う
+    libxml2が扱えないエンコーディング（ms932, euc_jp, ks_c_5601-1987 など）や、
+    指定エンコーディングとして不正なバイトが含まれる場合も、不正なバイトを置換して解析する
+    
+    Args:
+        chunks: 本文のチャンク
+        encoding: エンコーディング（Noneの場合は本文の先頭から判定する）
+    
+    Returns:
+        ルート要素（本文が空の場合はNone）
+    """
+    chunks = list(chunks)
+    if not any(chunk.strip() for chunk in chunks):
+        return None
+    
+    if encoding is None:
+        head = b''
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= SNIFF_BYTES:
+                break
+        encoding = detect_encoding(None, head)
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    
+    parser = HTMLParser()
+    for chunk in chunks:
+        parser.feed(decoder.decode(chunk))
+    parser.feed(decoder.decode(b'', final=True))
+    return parser.close()
+
+
+def parse_document(html: str, parser: Optional[HTMLParser] = None):
+    """
+    文字列のHTMLを解析する
+    
+    先頭のXML宣言は取り除いてから解析する
+    
+    Returns:
+        ルート要素（本文が空の場合はNone）
+    """
+    html = _XML_DECL_RE.sub('', html, count=1)
+    try:
+        return document_fromstring(html, parser=parser)
+    except etree.ParserError:
+        return None
+
+
+def sanitize_html(html: Union[str, bytes], encoding: Optional[str] = None) -> tuple[str, bool, int]:
     """
     HTMLをサニタイズし、危険なスクリプトタグを除去する
     
+    lxmlのCleanerで、scriptタグ・イベントハンドラ属性・javascript:スキーム・
+    style内のexpression()を1回の走査で除去する
+    
     Args:
-        html: 入力HTML
+        html: 入力HTML（文字列、またはレスポンス本文のバイト列）
+        encoding: htmlがバイト列の場合のエンコーディング（Noneの場合は本文の先頭から判定）
     
     Returns:
-        (サニタイズ済みHTML, スクリプトタグが存在したかどうか)
-    """
-    soup = BeautifulSoup(html, 'lxml')
-    has_scripts = False
-    
-    # script タグを除去
-    for script in soup.find_all('script'):
-        has_scripts = True
-        script.decompose()
-    
-    # style タグ内の expression() や javascript: を除去
-    for style in soup.find_all('style'):
-        if style.string:
-            style.string = re.sub(r'expression\s*\([^)]*\)', '', style.string, flags=re.IGNORECASE)
-            style.string = re.sub(r'javascript:', '', style.string, flags=re.IGNORECASE)
-    
-    # イベントハンドラ属性を除去
-    event_attrs = [
-        'onload', 'onerror', 'onclick', 'onmouseover', 'onmouseout',
-        'onmousedown', 'onmouseup', 'onkeydown', 'onkeyup', 'onkeypress',
-        'onfocus', 'onblur', 'onchange', 'onsubmit', 'onreset'
-    ]
-    
-    for tag in soup.find_all(True):
-        for attr in event_attrs:
-            if tag.has_attr(attr):
-                del tag[attr]
-        
-        # href や src の javascript: スキームを除去
-        for attr in ['href', 'src']:
-            if tag.has_attr(attr) and tag[attr].strip().lower().startswith('javascript:'):
-                del tag[attr]
+        (サニタイズ済みHTML, スクリプトタグが存在したかどうか, 要素数)
+    """
+    if isinstance(html, bytes):
+        tree = parse_html_chunks([html], encoding)
+    else:
+        tree = parse_document(html)
+    if tree is None:
+        return '', False, 0
+    
+    head = html[:SNIFF_BYTES]
+    if isinstance(head, bytes):
+        head = head.decode('ascii', errors='ignore')
+    has_scripts = tree.find('.//script') is not None
+    
+    _CLEANER(tree)
     
-    return str(soup), has_scripts
+    # 再パースせず、サニタイズ済みのツリーから要素数をカウントする
+    elements_count = sum(1 for _ in tree.iter(etree.Element))
+    
+    # 入力にDOCTYPE宣言がある場合のみ出力する（lxmlが補完する既定値は付けない）
+    doctype = tree.getroottree().docinfo.doctype if _DOCTYPE_RE.match(head) else None
+    return tostring(tree, encoding='unicode', doctype=doctype), has_scripts, elements_count
+
+
+def detect_encoding(
+    declared: Optional[str], head: bytes, default: Optional[str] = 'utf-8'
+) -> Optional[str]:
+    """
+    HTMLのエンコーディングを判定する
+    
+    バイトオーダーマーク、Content-Typeで宣言されたcharset、
+    先頭SNIFF_BYTESバイト内の<meta charset>、既定値の順に採用する
+    （BOMがある場合はBOMごとデコードされるエンコーディングを返す）
+    
+    Args:
+        declared: Content-Typeヘッダのcharset（無ければNone）
+        head: 本文の先頭部分
+        default: 判定できなかった場合のエンコーディング
+    """
+    for bom, encoding in _BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding
+    
+    candidates = [declared]
+    match = _META_CHARSET_RE.search(head[:SNIFF_BYTES])
+    if match:
+        candidates.append(match.group(1).decode('ascii'))
+    
+    for encoding in candidates:
+        if not encoding:
+            continue
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            continue
+        return encoding
+    return default
+
+
+# script/style/template内の文字列とコメントを除いたテキストノード
+_VISIBLE_TEXT_XPATH = etree.XPath(
+    './/text()[not(ancestor::script or ancestor::style or ancestor::template)]'
+)
+
+
+def element_text(element) -> str:
+    """
+    要素内のテキストを取得する
+    
+    各テキストの前後の空白を除去して連結する（BeautifulSoupの get_text(strip=True) 相当）
+    """
+    return ''.join(s.strip() for s in _VISIBLE_TEXT_XPATH(element))
+
+
+@functools.lru_cache(maxsize=512)
+def compile_selector(selector: str) -> CSSSelector:
+    """CSSセレクタをコンパイルする（同じセレクタはキャッシュを再利用する）"""
+    return CSSSelector(selector, translator='html')
+
+
+# 要素情報取得時に読み飛ばすタグ（セレクタの対象にならないもの）
+# noscript内の要素はスクレイピング時にも一致するため残す
+_INFO_SKIP_TAGS = ('script', 'style')
+
+# コメントと処理命令はツリーに含めない
+_INFO_PARSER = HTMLParser(remove_comments=True, remove_pis=True)
+
+
+# 要素情報として返すテキストの最大文字数
+ELEMENT_TEXT_LIMIT = 100
 
 
 def extract_element_info(element) -> dict:
     """要素から属性情報を抽出する"""
+    attrib = element.attrib
     info = {
-        'tag': element.name,
-        'class': element.get('class', []),
-        'id': element.get('id', ''),
-        'data_attrs': {}
+        'tag': element.tag,
+        'class': attrib.get('class', '').split(),
+        'id': attrib.get('id', ''),
+        # data-* 属性を抽出
+        'data_attrs': {attr: value for attr, value in attrib.items() if attr.startswith('data-')}
     }
     
-    # data-* 属性を抽出
-    for attr, value in element.attrs.items():
-        if attr.startswith('data-'):
-            info['data_attrs'][attr] = value
-    
-    # テキスト内容（先頭100文字まで）
-    text = element.get_text(strip=True)
-    info['text'] = text[:100] + '...' if len(text) > 100 else text
+    # テキスト内容（先頭100文字まで、element_text と同じくtemplate等の中の文字列は除く）
+    # 巨大な要素（bodyなど）でも全テキストを連結しないよう、上限を超えた時点で打ち切る
+    parts = []
+    length = 0
+    for s in _VISIBLE_TEXT_XPATH(element):
+        s = s.strip()
+        parts.append(s)
+        length += len(s)
+        if length > ELEMENT_TEXT_LIMIT:
+            break
+    text = ''.join(parts)
+    info['text'] = text[:ELEMENT_TEXT_LIMIT] + '...' if len(text) > ELEMENT_TEXT_LIMIT else text
     
     return info
 
@@ -103,11 +279,7 @@ async def parse_html(input_data: HtmlInput):
         if not input_data.html.strip():
             raise HTTPException(status_code=400, detail="HTMLが空です")
         
-        sanitized_html, has_scripts = sanitize_html(input_data.html)
-        
-        # 要素数をカウント
-        soup = BeautifulSoup(sanitized_html, 'lxml')
-        elements_count = len(soup.find_all(True))
+        sanitized_html, has_scripts, elements_count = sanitize_html(input_data.html)
         
         return HtmlParseResponse(
             sanitized_html=sanitized_html,
@@ -124,8 +296,16 @@ async def get_element_info(request: ElementInfoRequest):
     指定されたセレクタに一致する要素の情報を取得する
     """
     try:
-        soup = BeautifulSoup(request.html, 'lxml')
-        elements = soup.select(request.selector)
+        if not request.html.strip():
+            return {"elements": [], "message": "要素が見つかりません"}
+        
+        # BeautifulSoupのツリーは構築せず、lxmlで直接セレクタを適用する
+        tree = parse_document(request.html, parser=_INFO_PARSER)
+        if tree is None:
+            return {"elements": [], "message": "要素が見つかりません"}
+        
+        etree.strip_elements(tree, *_INFO_SKIP_TAGS, with_tail=False)
+        elements = compile_selector(request.selector)(tree)
         
         if not elements:
             return {"elements": [], "message": "要素が見つかりません"}
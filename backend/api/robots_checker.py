@@ -5,13 +5,54 @@ robots.txt チェックAPI
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List, Optional
-from urllib.parse import urlparse, urljoin
+from typing import Dict, List, NamedTuple, Optional, Union
+from urllib.parse import urlparse
 from urllib.robotparser import RobotFileParser
+from cachetools import TTLCache
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
+import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 
 router = APIRouter()
 
+DEFAULT_USER_AGENT = "FlexibleScrapingTool/1.0"
+
+
+def create_session() -> requests.Session:
+    """
+    コネクションプーリングを有効にしたHTTPセッションを生成する
+    
+    同一ホストへのリクエストでTCP/TLS接続を再利用する
+    """
+    session = requests.Session()
+    session.headers.update({"User-Agent": DEFAULT_USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# モジュール共有のセッション
+_session = create_session()
+
+# robots.txtの最大読み込みサイズ（Googleの仕様に合わせて500KBで打ち切る）
+ROBOTS_MAX_BYTES = 500 * 1024
+
+
+class RobotsEntry(NamedTuple):
+    """キャッシュするrobots.txtの内容と解析済みパーサー"""
+    content: Optional[str]
+    parser: Optional[RobotFileParser]
+
+
+# scheme://netloc をキーとしたrobots.txtキャッシュ（1時間有効）
+_robots_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+_robots_cache_lock = threading.Lock()
+# 同一ホストへの同時取得をまとめるためのホストごとのロック
+_robots_fetch_locks: Dict[str, threading.Lock] = {}
+
 
 class RobotsCheckInput(BaseModel):
     """robots.txt チェック入力モデル"""
@@ -24,6 +65,7 @@ class RobotsCheckResult(BaseModel):
     url: str
     allowed: bool
     robots_url: str
+    error: Optional[str] = None  # robots.txtを取得できなかった場合の理由
 
 
 class RobotsCheckResponse(BaseModel):
@@ -39,27 +81,124 @@ def get_robots_url(url: str) -> str:
     return f"{parsed.scheme}://{parsed.netloc}/robots.txt"
 
 
-def fetch_robots_txt(robots_url: str, timeout: int = 10) -> Optional[str]:
-    """robots.txtを取得する"""
+def get_robots_key(url: str) -> str:
+    """robots.txtキャッシュのキー（scheme://netloc）を生成する"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+class RobotsServerError(requests.HTTPError):
+    """robots.txtの取得で5xxが返された（一時的な障害として再試行する）"""
+
+
+@retry(
+    retry=retry_if_exception_type((requests.ConnectionError, requests.Timeout, RobotsServerError)),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential_jitter(initial=0.5, max=8),
+    reraise=True,
+)
+def _download_robots_txt(robots_url: str, timeout: int = 10) -> Optional[str]:
+    """
+    robots.txtをダウンロードする（先頭ROBOTS_MAX_BYTESまで）
+    
+    接続エラー・タイムアウト・5xxは指数バックオフで再試行し、それでも失敗した場合は例外を送出する
+    （一時的な障害を「robots.txtなし＝許可」とみなさないため）
+    4xxなどその他の応答はrobots.txtなし（許可）とみなす
+    """
     try:
-        response = requests.get(robots_url, timeout=timeout)
-        if response.status_code == 200:
-            return response.text
-        return None
+        with _session.get(robots_url, timeout=timeout, stream=True) as response:
+            if response.status_code >= 500:
+                raise RobotsServerError(
+                    f"robots.txtの取得に失敗しました: {response.status_code}",
+                    response=response
+                )
+            if response.status_code != 200:
+                return None
+            
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= ROBOTS_MAX_BYTES:
+                    break
+            
+            body = b"".join(chunks)[:ROBOTS_MAX_BYTES]
+            return body.decode(response.encoding or "utf-8", errors="replace")
+    except (requests.ConnectionError, requests.Timeout, RobotsServerError):
+        raise
     except requests.RequestException:
         return None
 
 
-def check_url_allowed(robots_content: Optional[str], url: str, user_agent: str = "*") -> bool:
+def get_robots_entry(url: str, timeout: int = 10) -> RobotsEntry:
+    """
+    URLのホストに対応するrobots.txtを取得・解析する
+    
+    結果はホストごとにキャッシュし、同一ホストへの同時取得は1回にまとめる
+    """
+    key = get_robots_key(url)
+    
+    with _robots_cache_lock:
+        entry = _robots_cache.get(key)
+        if entry is not None:
+            return entry
+        fetch_lock = _robots_fetch_locks.setdefault(key, threading.Lock())
+    
+    with fetch_lock:
+        try:
+            # 待機中に他のスレッドが取得済みであればそれを使う
+            with _robots_cache_lock:
+                entry = _robots_cache.get(key)
+            if entry is not None:
+                return entry
+            
+            content = _download_robots_txt(f"{key}/robots.txt", timeout=timeout)
+            parser = None
+            if content is not None:
+                parser = RobotFileParser()
+                parser.parse(content.splitlines())
+            entry = RobotsEntry(content=content, parser=parser)
+            
+            with _robots_cache_lock:
+                _robots_cache[key] = entry
+        finally:
+            # 取得に失敗した場合もロックを残さない（失敗結果はキャッシュしない）
+            with _robots_cache_lock:
+                if _robots_fetch_locks.get(key) is fetch_lock:
+                    del _robots_fetch_locks[key]
+    
+    return entry
+
+
+def fetch_robots_txt(robots_url: str, timeout: int = 10) -> Optional[str]:
+    """robots.txtを取得する（キャッシュ済みの場合は再取得しない）"""
+    return get_robots_entry(robots_url, timeout=timeout).content
+
+
+def get_parser(url: str) -> Optional[RobotFileParser]:
+    """URLのホストに対応する解析済みのrobots.txtパーサーを取得する"""
+    return get_robots_entry(url).parser
+
+
+def check_url_allowed(
+    robots: Union[str, RobotFileParser, None], url: str, user_agent: str = "*"
+) -> bool:
     """
     URLがrobots.txtで許可されているかチェックする
     robots.txtが存在しない場合は許可とみなす
+    
+    Args:
+        robots: robots.txtの内容、または解析済みのパーサー
     """
-    if robots_content is None:
+    if robots is None:
         return True
     
+    if isinstance(robots, RobotFileParser):
+        return robots.can_fetch(user_agent, url)
+    
     rp = RobotFileParser()
-    rp.parse(robots_content.splitlines())
+    rp.parse(robots.splitlines())
     return rp.can_fetch(user_agent, url)
 
 
@@ -77,8 +216,7 @@ async def check_robots(input_data: RobotsCheckInput):
         # ドメインごとにURLをグループ化
         domain_urls = {}
         for url in input_data.urls:
-            parsed = urlparse(url)
-            domain = f"{parsed.scheme}://{parsed.netloc}"
+            domain = get_robots_key(url)
             if domain not in domain_urls:
                 domain_urls[domain] = []
             domain_urls[domain].append(url)
@@ -88,15 +226,31 @@ async def check_robots(input_data: RobotsCheckInput):
         all_allowed = True
         first_robots_content = None
         
-        for domain, urls in domain_urls.items():
+        # robots.txtの取得・解析はドメインごとに1回のみ（キャッシュ済みのパーサーを使用）
+        # 取得はブロッキングI/Oのため、イベントループを止めないよう別スレッドで並行に行う
+        entries = await asyncio.gather(*(
+            asyncio.to_thread(get_robots_entry, f"{domain}/robots.txt")
+            for domain in domain_urls
+        ), return_exceptions=True)
+        
+        for (domain, urls), robots in zip(domain_urls.items(), entries):
             robots_url = f"{domain}/robots.txt"
-            robots_content = fetch_robots_txt(robots_url)
             
-            if first_robots_content is None and robots_content:
-                first_robots_content = robots_content
+            # 取得に失敗したドメインは許可とみなさず、他のドメインの結果はそのまま返す
+            if isinstance(robots, Exception):
+                all_allowed = False
+                error = f"robots.txt取得エラー: {str(robots)}"
+                results.extend(
+                    RobotsCheckResult(url=url, allowed=False, robots_url=robots_url, error=error)
+                    for url in urls
+                )
+                continue
+            
+            if first_robots_content is None and robots.content:
+                first_robots_content = robots.content
             
             for url in urls:
-                allowed = check_url_allowed(robots_content, url, input_data.user_agent)
+                allowed = check_url_allowed(robots.parser, url, input_data.user_agent)
                 if not allowed:
                     all_allowed = False
                 
@@ -124,7 +278,7 @@ async def fetch_robots(url: str):
     """
     try:
         robots_url = get_robots_url(url)
-        content = fetch_robots_txt(robots_url)
+        content = await asyncio.to_thread(fetch_robots_txt, robots_url)
         
         if content is None:
             return {
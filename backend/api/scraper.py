@@ -6,11 +6,21 @@ URLリストに対してスクレイピングを実行し、結果を返却す
 from fastapi import APIRouter, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from bs4 import BeautifulSoup
-import requests
-import time
-import json
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from collections import defaultdict
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from lxml import etree
+from .html_parser import compile_selector, detect_encoding, element_text, parse_html_chunks
+from tenacity import (
+    retry,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential_jitter,
+)
+import aiohttp
+import orjson
 import asyncio
 
 router = APIRouter()
@@ -44,7 +54,196 @@ class ScrapeResponse(BaseModel):
     error_count: int
 
 
-def scrape_single_url(
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (compatible; WebScrapingTool/1.0; Educational Purpose)'
+}
+
+# 同時接続数の上限（ホストごとは1接続に制限）
+MAX_CONNECTIONS = 20
+
+# レスポンスを読み込むチャンクサイズ
+STREAM_CHUNK_SIZE = 32 * 1024
+
+# コンテンツプレビュー用に保持する先頭バイト数と文字数
+PREVIEW_BYTES = 16 * 1024
+PREVIEW_CHARS = 1000
+
+
+def create_session() -> aiohttp.ClientSession:
+    """
+    スクレイピング用のHTTPセッションを生成する
+    
+    同一ホストへの同時接続は1本に制限し、異なるホストへは並行してアクセスする
+    """
+    connector = aiohttp.TCPConnector(
+        limit=MAX_CONNECTIONS,
+        limit_per_host=1,
+        ttl_dns_cache=300
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+def extract_texts(
+    root: etree._Element,
+    selector: str,
+    exclude_tags: Optional[List[str]] = None
+) -> List[str]:
+    """セレクタに一致する要素のテキストを抽出する"""
+    extracted_texts = []
+    for el in compile_selector(selector)(root):
+        # 除外タグを削除してからテキスト取得
+        if exclude_tags:
+            etree.strip_elements(el, *exclude_tags, with_tail=False)
+        extracted_texts.append(element_text(el))
+    return extracted_texts
+
+
+def group_urls_by_host(urls: List[str]) -> Dict[str, List[Tuple[int, str]]]:
+    """URLをホストごとにグループ化する（元の順序のインデックス付き）"""
+    host_urls = defaultdict(list)
+    for i, url in enumerate(urls):
+        host_urls[urlparse(url).netloc].append((i, url))
+    return host_urls
+
+
+# 再試行の設定（429と5xx、接続エラーのみ再試行し、4xxは再試行しない）
+RETRY_ATTEMPTS = 3
+RETRY_MAX_WAIT = 30.0
+
+
+class RetryableStatusError(Exception):
+    """再試行対象のHTTPステータス（429 / 5xx）"""
+    
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTPエラー: {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def is_retryable_status(status_code: int) -> bool:
+    """再試行すべきステータスかどうか"""
+    return status_code == 429 or status_code >= 500
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-Afterヘッダ（秒数またはHTTP日付）を待機秒数に変換する"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+_backoff = wait_exponential_jitter(initial=0.5, max=8)
+
+
+def wait_retry_after(retry_state) -> float:
+    """Retry-Afterが指定されていればそれに従い、無ければ指数バックオフで待機する"""
+    exc = retry_state.outcome.exception()
+    if isinstance(exc, RetryableStatusError) and exc.retry_after is not None:
+        return min(exc.retry_after, RETRY_MAX_WAIT)
+    return _backoff(retry_state)
+
+
+class FetchedPage(NamedTuple):
+    """取得したレスポンス"""
+    status_code: int
+    charset: Optional[str]  # Content-Typeのcharset
+    chunks: List[bytes]  # 本文（未デコードのチャンク）
+
+
+@retry(
+    retry=retry_if_exception_type((RetryableStatusError, aiohttp.ClientConnectionError)),
+    stop=stop_after_attempt(RETRY_ATTEMPTS),
+    wait=wait_retry_after,
+    reraise=True,
+)
+async def fetch_page(
+    session: aiohttp.ClientSession,
+    url: str,
+    read_all: bool,
+    timeout: int,
+    headers: dict
+) -> FetchedPage:
+    """
+    URLのレスポンスを取得する
+    
+    read_all が False の場合は、プレビューに必要な先頭 PREVIEW_BYTES だけを受信して接続を閉じる
+    ステータスが200以外の場合は本文を読み込まない
+    429 / 5xx と接続エラーは再試行し、最終的に失敗した場合は例外を送出する
+    """
+    async with session.get(
+        url,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers=headers
+    ) as response:
+        if is_retryable_status(response.status):
+            raise RetryableStatusError(
+                response.status, parse_retry_after(response.headers.get('Retry-After'))
+            )
+        
+        chunks = []
+        if response.status != 200:
+            return FetchedPage(response.status, response.charset, chunks)
+        
+        size = 0
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            chunks.append(chunk)
+            size += len(chunk)
+            if not read_all and size >= PREVIEW_BYTES:
+                # 残りは受信せずに接続を閉じる
+                response.close()
+                break
+        
+        return FetchedPage(response.status, response.charset, chunks)
+
+
+def extract_content(
+    chunks: List[bytes],
+    charset: Optional[str],
+    selector: Optional[str] = None,
+    exclude_tags: Optional[List[str]] = None
+) -> Tuple[str, Optional[List[str]]]:
+    """
+    本文からプレビューとセレクタに一致する要素のテキストを抽出する（CPU処理のみ）
+    
+    Returns:
+        (コンテンツのプレビュー, 抽出データ（セレクタ未指定の場合はNone）)
+    """
+    # 先頭部分はエンコーディング判定とプレビューに使う
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk[:PREVIEW_BYTES - len(head)]
+        if len(head) >= PREVIEW_BYTES:
+            break
+    encoding = detect_encoding(charset, head)
+    
+    # セレクタが指定されていれば抽出
+    extracted_data = None
+    if selector:
+        extracted_data = []
+        if chunks:
+            # 本文は連結せず、チャンクごとにデコードしてlxmlのパーサーへ渡す
+            root = parse_html_chunks(chunks, encoding)
+            # 空白のみの本文など、要素が無い場合は抽出結果なし
+            if root is not None:
+                extracted_data = extract_texts(root, selector, exclude_tags)
+    
+    # コンテンツ全体（先頭1000文字まで）
+    content = bytes(head).decode(encoding, errors='replace')[:PREVIEW_CHARS]
+    return content, extracted_data
+
+
+async def scrape_single_url_async(
+    session: aiohttp.ClientSession,
     url: str,
     selector: Optional[str] = None,
     exclude_tags: Optional[List[str]] = None,
@@ -53,58 +252,56 @@ def scrape_single_url(
 ) -> ScrapeResult:
     """
     単一URLをスクレイピングする
+    
+    HTMLの解析はスレッドで行い、解析中も他のURLの通信を進められるようにする
     """
-    default_headers = {
-        'User-Agent': 'Mozilla/5.0 (compatible; WebScrapingTool/1.0; Educational Purpose)'
-    }
+    request_headers = dict(DEFAULT_HEADERS)
     if headers:
-        default_headers.update(headers)
+        request_headers.update(headers)
     
     try:
-        response = requests.get(url, timeout=timeout, headers=default_headers)
+        page = await fetch_page(
+            session,
+            url,
+            read_all=bool(selector),
+            timeout=timeout,
+            headers=request_headers
+        )
         
-        if response.status_code != 200:
+        if page.status_code != 200:
             return ScrapeResult(
                 url=url,
                 success=False,
-                status_code=response.status_code,
-                error=f"HTTPエラー: {response.status_code}"
+                status_code=page.status_code,
+                error=f"HTTPエラー: {page.status_code}"
             )
         
-        soup = BeautifulSoup(response.text, 'lxml')
-        
-        # セレクタが指定されていれば抽出
-        extracted_data = None
-        if selector:
-            elements = soup.select(selector)
-            extracted_texts = []
-            for el in elements:
-                # 除外タグを削除してからテキスト取得
-                if exclude_tags:
-                    for tag in exclude_tags:
-                        for child in el.find_all(tag):
-                            child.decompose()
-                extracted_texts.append(el.get_text(strip=True))
-            extracted_data = extracted_texts
-        
-        # コンテンツ全体（先頭1000文字まで）
-        content = response.text[:1000]
+        content, extracted_data = await asyncio.to_thread(
+            extract_content, page.chunks, page.charset, selector, exclude_tags
+        )
         
         return ScrapeResult(
             url=url,
             success=True,
-            status_code=response.status_code,
+            status_code=page.status_code,
             content=content,
             extracted_data=extracted_data
         )
     
-    except requests.Timeout:
+    except RetryableStatusError as e:
+        return ScrapeResult(
+            url=url,
+            success=False,
+            status_code=e.status_code,
+            error=f"HTTPエラー: {e.status_code}"
+        )
+    except asyncio.TimeoutError:
         return ScrapeResult(
             url=url,
             success=False,
             error="タイムアウトしました"
         )
-    except requests.RequestException as e:
+    except aiohttp.ClientError as e:
         return ScrapeResult(
             url=url,
             success=False,
@@ -118,12 +315,51 @@ def scrape_single_url(
         )
 
 
+async def scrape_host_urls(
+    session: aiohttp.ClientSession,
+    host_urls: List[Tuple[int, str]],
+    config: ScrapeConfig,
+    on_start: Optional[Callable[[int, str], Awaitable[None]]] = None,
+    on_result: Optional[Callable[[int, ScrapeResult], Awaitable[None]]] = None
+) -> None:
+    """
+    同一ホストのURLを順番にスクレイピングする
+    
+    リクエスト間隔（sleep_interval）はホストごとに適用する
+    """
+    for n, (index, url) in enumerate(host_urls):
+        if on_start:
+            await on_start(index, url)
+        
+        result = await scrape_single_url_async(
+            session,
+            url=url,
+            selector=config.selector,
+            exclude_tags=config.exclude_tags,
+            timeout=config.timeout,
+            headers=config.headers
+        )
+        
+        if on_result:
+            await on_result(index, result)
+        
+        # ホスト内の最後のURL以外はスリープ
+        if n < len(host_urls) - 1:
+            await asyncio.sleep(config.sleep_interval)
+
+
+def sse_event(data: dict) -> bytes:
+    """Server-Sent Events の data 行を生成する（orjsonでシリアライズ）"""
+    return b"data: " + orjson.dumps(data) + b"\n\n"
+
+
 @router.post("/scrape", response_model=ScrapeResponse)
 async def scrape_urls(config: ScrapeConfig):
     """
     URLリストに対してスクレイピングを実行する
     
-    注意: このエンドポイントは同期的に処理し、すべての結果を返却します
+    注意: このエンドポイントはすべてのURLの処理完了後に結果を返却します
+    異なるホストのURLは並行して処理されます
     """
     try:
         if not config.urls:
@@ -132,29 +368,20 @@ async def scrape_urls(config: ScrapeConfig):
         if len(config.urls) > 100:
             raise HTTPException(status_code=400, detail="URLは100件まで指定可能です")
         
-        results = []
-        success_count = 0
-        error_count = 0
+        results: List[Optional[ScrapeResult]] = [None] * len(config.urls)
         
-        for i, url in enumerate(config.urls):
-            result = scrape_single_url(
-                url=url,
-                selector=config.selector,
-                exclude_tags=config.exclude_tags,
-                timeout=config.timeout,
-                headers=config.headers
-            )
-            
-            if result.success:
-                success_count += 1
-            else:
-                error_count += 1
-            
-            results.append(result)
-            
-            # 最後のURL以外はスリープ
-            if i < len(config.urls) - 1:
-                await asyncio.sleep(config.sleep_interval)
+        async def store_result(index: int, result: ScrapeResult) -> None:
+            results[index] = result
+        
+        # ホストごとに並行してスクレイピング
+        async with create_session() as session:
+            await asyncio.gather(*[
+                scrape_host_urls(session, host_urls, config, on_result=store_result)
+                for host_urls in group_urls_by_host(config.urls).values()
+            ])
+        
+        success_count = sum(1 for r in results if r.success)
+        error_count = len(results) - success_count
         
         return ScrapeResponse(
             results=results,
@@ -178,7 +405,7 @@ async def scrape_urls_stream(config: ScrapeConfig):
     async def generate():
         try:
             if not config.urls:
-                yield f"data: {json.dumps({'error': 'URLリストが空です'})}\n\n"
+                yield sse_event({'error': 'URLリストが空です'})
                 return
             
             total = len(config.urls)
@@ -186,37 +413,60 @@ async def scrape_urls_stream(config: ScrapeConfig):
             error_count = 0
             
             # 開始イベント
-            yield f"data: {json.dumps({'type': 'start', 'total': total})}\n\n"
+            yield sse_event({'type': 'start', 'total': total})
             
-            for i, url in enumerate(config.urls):
-                # 進捗イベント
-                yield f"data: {json.dumps({'type': 'progress', 'current': i + 1, 'total': total, 'url': url})}\n\n"
-                
-                result = scrape_single_url(
-                    url=url,
-                    selector=config.selector,
-                    exclude_tags=config.exclude_tags,
-                    timeout=config.timeout,
-                    headers=config.headers
-                )
-                
-                if result.success:
-                    success_count += 1
-                else:
-                    error_count += 1
-                
-                # 結果イベント
-                yield f"data: {json.dumps({'type': 'result', 'data': result.model_dump()})}\n\n"
+            current = 0
+            queue: asyncio.Queue = asyncio.Queue()
+            
+            async def on_start(index: int, url: str) -> None:
+                await queue.put(('progress', url))
+            
+            async def on_result(index: int, result: ScrapeResult) -> None:
+                await queue.put(('result', result))
+            
+            async def run_all() -> None:
+                try:
+                    async with create_session() as session:
+                        await asyncio.gather(*[
+                            scrape_host_urls(session, host_urls, config, on_start, on_result)
+                            for host_urls in group_urls_by_host(config.urls).values()
+                        ])
+                finally:
+                    # 終了の合図
+                    queue.put_nowait(None)
+            
+            task = asyncio.create_task(run_all())
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    
+                    event_type, payload = item
+                    if event_type == 'progress':
+                        # 進捗イベント
+                        current += 1
+                        yield sse_event({'type': 'progress', 'current': current, 'total': total, 'url': payload})
+                    else:
+                        if payload.success:
+                            success_count += 1
+                        else:
+                            error_count += 1
+                        
+                        # 結果イベント
+                        yield sse_event({'type': 'result', 'data': payload.model_dump()})
                 
-                # 最後のURL以外はスリープ
-                if i < len(config.urls) - 1:
-                    await asyncio.sleep(config.sleep_interval)
+                await task
+            finally:
+                # クライアント切断時などは残りの処理を中止
+                if not task.done():
+                    task.cancel()
             
             # 完了イベント
-            yield f"data: {json.dumps({'type': 'complete', 'total': total, 'success_count': success_count, 'error_count': error_count})}\n\n"
+            yield sse_event({'type': 'complete', 'total': total, 'success_count': success_count, 'error_count': error_count})
         
         except Exception as e:
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            yield sse_event({'type': 'error', 'message': str(e)})
     
     return StreamingResponse(
         generate(),
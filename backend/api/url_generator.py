@@ -5,7 +5,10 @@ URL生成API
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import List, Union
+from typing import Dict, Iterator, List, Tuple, Union
+from collections.abc import Sequence
+from itertools import islice
+import math
 import re
 
 router = APIRouter()
@@ -23,9 +26,36 @@ class UrlGenerateResponse(BaseModel):
     count: int
 
 
-def parse_placeholder_value(placeholder_config: dict) -> List[str]:
+class PlaceholderValues(Sequence):
     """
-    プレースホルダ設定から値のリストを生成する
+    プレースホルダの値のシーケンス
+    
+    元の range / list を保持し、アクセスされた値だけを文字列化する
+    """
+    
+    def __init__(self, source: Union[range, list]):
+        self._source = source
+    
+    def __len__(self) -> int:
+        return len(self._source)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return PlaceholderValues(self._source[index])
+        return str(self._source[index])
+    
+    def __iter__(self) -> Iterator[str]:
+        return map(str, self._source)
+    
+    @property
+    def source(self) -> Union[range, list]:
+        """文字列化前の元の値（range / list）"""
+        return self._source
+
+
+def parse_placeholder_value(placeholder_config: dict) -> PlaceholderValues:
+    """
+    プレースホルダ設定から値のシーケンスを生成する
     
     Args:
         placeholder_config: プレースホルダ設定
@@ -33,7 +63,7 @@ def parse_placeholder_value(placeholder_config: dict) -> List[str]:
             - type: "list" の場合 → values を使用
     
     Returns:
-        値のリスト
+        値のシーケンス（件数は len() で取得でき、値は必要になった時点で文字列化される）
     """
     placeholder_type = placeholder_config.get('type', 'list')
     
@@ -41,16 +71,61 @@ def parse_placeholder_value(placeholder_config: dict) -> List[str]:
         start = int(placeholder_config.get('start', 1))
         end = int(placeholder_config.get('end', 10))
         step = int(placeholder_config.get('step', 1))
-        return [str(i) for i in range(start, end + 1, step)]
+        return PlaceholderValues(range(start, end + 1, step))
     
     elif placeholder_type == 'list':
         values = placeholder_config.get('values', [])
-        return [str(v) for v in values]
+        return PlaceholderValues(list(values))
     
     else:
         raise ValueError(f"未対応のプレースホルダタイプ: {placeholder_type}")
 
 
+def parse_placeholders(placeholders: dict) -> Dict[str, PlaceholderValues]:
+    """プレースホルダ設定の辞書から、キーごとの値のシーケンスを生成する"""
+    return {key: parse_placeholder_value(config) for key, config in placeholders.items()}
+
+
+def count_combinations(placeholder_values: Dict[str, PlaceholderValues]) -> int:
+    """生成されるURLの総数（各プレースホルダの値の数の積）"""
+    return math.prod(len(values) for values in placeholder_values.values())
+
+
+def iter_combinations(value_lists: List[PlaceholderValues]) -> Iterator[Tuple[str, ...]]:
+    """
+    itertools.product と同じ順序で値の組み合わせを生成する
+    
+    product と異なり入力を事前に展開しないため、取り出した組み合わせの分だけ値を文字列化する
+    """
+    sizes = [len(values) for values in value_lists]
+    for n in range(math.prod(sizes)):
+        combination = []
+        for values, size in zip(reversed(value_lists), reversed(sizes)):
+            n, index = divmod(n, size)
+            combination.append(values[index])
+        yield tuple(reversed(combination))
+
+
+def split_template(template: str, keys: List[str]) -> Tuple[List[str], List[int]]:
+    """
+    テンプレートをプレースホルダの位置で分割する
+    
+    Args:
+        template: URLテンプレート
+        keys: プレースホルダ名のリスト
+    
+    Returns:
+        (リテラル部分のリスト, 各プレースホルダ位置に入るキーのインデックス)
+        リテラル部分はプレースホルダ数 + 1 個になる
+    """
+    pattern = re.compile('|'.join(re.escape(f"{{{key}}}") for key in keys))
+    key_index = {f"{{{key}}}": i for i, key in enumerate(keys)}
+    
+    literals = pattern.split(template)
+    field_order = [key_index[m.group(0)] for m in pattern.finditer(template)]
+    return literals, field_order
+
+
 def generate_urls(template: str, placeholders: dict, max_urls: int = 100) -> List[str]:
     """
     テンプレートとプレースホルダからURLリストを生成する
@@ -66,35 +141,38 @@ def generate_urls(template: str, placeholders: dict, max_urls: int = 100) -> Lis
     if not placeholders:
         return [template]
     
-    # プレースホルダの値を展開
-    placeholder_values = {}
-    for key, config in placeholders.items():
-        placeholder_values[key] = parse_placeholder_value(config)
+    return build_urls(template, parse_placeholders(placeholders), max_urls)
+
+
+def build_urls(
+    template: str, placeholder_values: Dict[str, PlaceholderValues], max_urls: int = 100
+) -> List[str]:
+    """
+    テンプレートと展開済みのプレースホルダの値からURLリストを生成する
     
-    # 組み合わせを生成（単一プレースホルダの場合）
-    if len(placeholder_values) == 1:
-        key = list(placeholder_values.keys())[0]
-        values = placeholder_values[key]
-        urls = []
-        for value in values[:max_urls]:
-            url = template.replace(f"{{{key}}}", value)
-            urls.append(url)
-        return urls
+    組み合わせは max_urls 件分だけ列挙する
+    """
+    keys = list(placeholder_values.keys())
     
-    # 複数プレースホルダの場合は直積を生成
-    from itertools import product
+    # テンプレートは最初に一度だけ分割し、URLごとの置換走査を省く
+    literals, field_order = split_template(template, keys)
     
-    keys = list(placeholder_values.keys())
+    # 単一プレースホルダで1箇所のみの場合は、元の range / list から直接生成する
+    if len(field_order) == 1 and len(keys) == 1:
+        prefix, suffix = literals
+        return [f"{prefix}{value}{suffix}" for value in placeholder_values[keys[0]][:max_urls].source]
+    
+    # 複数プレースホルダの場合は直積を生成（max_urls件まで）
     value_lists = [placeholder_values[k] for k in keys]
+    tail = literals[1:]
     
     urls = []
-    for combination in product(*value_lists):
-        if len(urls) >= max_urls:
-            break
-        url = template
-        for key, value in zip(keys, combination):
-            url = url.replace(f"{{{key}}}", value)
-        urls.append(url)
+    for combination in islice(iter_combinations(value_lists), max_urls):
+        parts = [literals[0]]
+        for index, literal in zip(field_order, tail):
+            parts.append(combination[index])
+            parts.append(literal)
+        urls.append("".join(parts))
     
     return urls
 
@@ -131,17 +209,13 @@ async def preview_template(input_data: UrlTemplateInput):
     URLテンプレートのプレビュー（最初の5件のみ）
     """
     try:
-        urls = generate_urls(input_data.template, input_data.placeholders, max_urls=5)
-        total_count = 1
-        
-        for config in input_data.placeholders.values():
-            if config.get('type') == 'range':
-                start = int(config.get('start', 1))
-                end = int(config.get('end', 10))
-                step = int(config.get('step', 1))
-                total_count *= len(range(start, end + 1, step))
-            elif config.get('type') == 'list':
-                total_count *= len(config.get('values', []))
+        if input_data.placeholders:
+            placeholder_values = parse_placeholders(input_data.placeholders)
+            urls = build_urls(input_data.template, placeholder_values, max_urls=5)
+            total_count = count_combinations(placeholder_values)
+        else:
+            urls = [input_data.template]
+            total_count = 1
         
         return {
             "preview": urls,
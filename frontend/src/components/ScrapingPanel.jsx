@@ -102,7 +102,7 @@ function ScrapingPanel({ urls = [], selector = '', onScrapingComplete, onViewRes
                 const { done, value } = await reader.read()
                 if (done) break
 
-                const chunk = decoder.decode(value)
+                const chunk = decoder.decode(value, { stream: true })
                 const lines = chunk.split('\n').filter(line => line.startsWith('data: '))
 
                 for (const line of lines) {
@@ -182,7 +182,7 @@ function ScrapingPanel({ urls = [], selector = '', onScrapingComplete, onViewRes
                                     {url}
                                 </span>
                                 {robotsResults?.results?.[i]?.allowed === false && (
-                                    <span className="text-red-400 text-xs">⚠ 制限</span>
+                                    <span className="text-red-400 text-xs" title={robotsResults.results[i].error || undefined}>⚠ 制限</span>
                                 )}
                             </div>
                         ))}
@@ -1,36 +1,35 @@
 import re
 import json
+from itertools import islice
+
+# 番号付き見出し（例: "747. "）
+_NUM_RE = re.compile(r'(\d+)\.\s+(.*)')
 
 def parse_proverbs(file_path, start_line, end_line):
     groups = []
     current_group = None
     
     with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
-    # Adjust for 0-indexed list
-    lines_to_process = lines[max(0, start_line-1):end_line]
-    
-    for line in lines_to_process:
-        line = line.strip()
-        if not line:
-            continue
+        # Adjust for 0-indexed lines, reading only the requested range
+        for line in islice(f, max(0, start_line-1), end_line):
+            line = line.strip()
+            if not line:
+                continue
             
-        # Check for numbered identifier (e.g., "747. ")
-        match_num = re.match(r'^(\d+)\.\s+(.*)', line)
-        # Check for hyphen variant (e.g., "- ")
-        match_hyphen = re.match(r'^-\s+(.*)', line)
-        
-        if match_num:
-            if current_group:
-                groups.append(current_group)
-            current_group = {
-                'id': match_num.group(1),
-                'main': match_num.group(2),
-                'variants': []
-            }
-        elif match_hyphen and current_group:
-            current_group['variants'].append(match_hyphen.group(1))
+            # Check for numbered identifier (e.g., "747. ")
+            if line[:1].isdigit():
+                match_num = _NUM_RE.match(line)
+                if match_num:
+                    if current_group:
+                        groups.append(current_group)
+                    current_group = {
+                        'id': match_num.group(1),
+                        'main': match_num.group(2),
+                        'variants': []
+                    }
+            # Check for hyphen variant (e.g., "- ")
+            elif line[:1] == '-' and line[1:2].isspace() and current_group:
+                current_group['variants'].append(line[1:].lstrip())
             
     if current_group:
         groups.append(current_group)
@@ -2,20 +2,23 @@
 表記揺れ単語の名寄せプログラム（グラフ理論マージ方式）
 """
 
+from bisect import bisect_right
 from collections import Counter
 from pathlib import Path
 
-import Levenshtein
-import jellyfish
 import networkx as nx
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import JaroWinkler, Levenshtein
+from scipy import sparse
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 # しきい値設定（調整可能）
 LEVENSHTEIN_THRESHOLD = 0.9  # 正規化スコア（0-1）
 JARO_WINKLER_THRESHOLD = 0.9  # スコア（0-1）
 NGRAM_COSINE_THRESHOLD = 0.9  # コサイン類似度（0-1）
 NGRAM_SIZE = 2  # Bi-gram
+BLOCK_SIZE = 4096  # 類似度行列を分割計算するブロックサイズ（メモリ使用量の上限）
 
 
 def load_words(input_path: str) -> list[str]:
@@ -34,18 +37,12 @@ def get_unique_words_with_frequency(words: list[str]) -> tuple[list[str], Counte
 
 def normalized_levenshtein(s1: str, s2: str) -> float:
     """正規化レーベンシュタイン類似度（0-1）"""
-    if not s1 and not s2:
-        return 1.0
-    max_len = max(len(s1), len(s2))
-    if max_len == 0:
-        return 1.0
-    distance = Levenshtein.distance(s1, s2)
-    return 1.0 - (distance / max_len)
+    return Levenshtein.normalized_similarity(s1, s2)
 
 
 def jaro_winkler_similarity(s1: str, s2: str) -> float:
     """ジャロ・ウィンクラー類似度"""
-    return jellyfish.jaro_winkler_similarity(s1, s2)
+    return JaroWinkler.similarity(s1, s2)
 
 
 def ngram_tokenizer(text: str, n: int = NGRAM_SIZE) -> list[str]:
@@ -55,10 +52,15 @@ def ngram_tokenizer(text: str, n: int = NGRAM_SIZE) -> list[str]:
     return [text[i : i + n] for i in range(len(text) - n + 1)]
 
 
-def compute_ngram_similarity_matrix(words: list[str]) -> dict[tuple[int, int], float]:
-    """N-gramコサイン類似度行列を計算"""
+def compute_ngram_similarity_edges(words: list[str]) -> list[tuple[int, int]]:
+    """
+    N-gramコサイン類似度がしきい値以上のペアを抽出
+
+    TF-IDFベクトルはL2正規化済みのため、疎行列の積がそのままコサイン類似度になる。
+    密な類似度行列やペアごとの辞書は作らず、しきい値以上の要素のみ取り出す。
+    """
     if len(words) < 2:
-        return {}
+        return []
 
     vectorizer = TfidfVectorizer(
         analyzer="char", ngram_range=(NGRAM_SIZE, NGRAM_SIZE)
@@ -66,47 +68,108 @@ def compute_ngram_similarity_matrix(words: list[str]) -> dict[tuple[int, int], f
 
     try:
         tfidf_matrix = vectorizer.fit_transform(words)
-        cos_sim = cosine_similarity(tfidf_matrix)
     except ValueError:
-        return {}
+        return []
 
-    similarity_dict = {}
-    for i in range(len(words)):
-        for j in range(i + 1, len(words)):
-            similarity_dict[(i, j)] = cos_sim[i, j]
+    cos_sim = sparse.triu(tfidf_matrix @ tfidf_matrix.T, k=1).tocoo()
+    mask = cos_sim.data >= NGRAM_COSINE_THRESHOLD
 
-    return similarity_dict
+    return list(zip(cos_sim.row[mask].tolist(), cos_sim.col[mask].tolist()))
 
 
-def build_similarity_graph(words: list[str]) -> nx.Graph:
-    """類似度に基づいてグラフを構築"""
-    graph = nx.Graph()
-    graph.add_nodes_from(range(len(words)))
+def min_length_ratio() -> float:
+    """
+    しきい値を超え得る単語ペアの文字列長の比（短い方/長い方）の下限
+
+    - レーベンシュタイン: 1 - |la - lb| / max(la, lb) >= T より la / lb >= T
+    - ジャロ・ウィンクラー: JW <= 0.4 + 0.6 * Jaro（接頭辞ボーナス最大4文字 x 0.1）、
+      Jaro <= (2 + la / lb) / 3 より la / lb >= 3 * (T - 0.4) / 0.6 - 2
+    """
+    jaro_min = (JARO_WINKLER_THRESHOLD - 0.4) / 0.6
+    jw_ratio = 3 * jaro_min - 2
+    return max(0.0, min(LEVENSHTEIN_THRESHOLD, jw_ratio))
 
-    # N-gram類似度を事前計算
-    ngram_sim = compute_ngram_similarity_matrix(words)
 
-    # 全ペアを比較
-    for i in range(len(words)):
-        for j in range(i + 1, len(words)):
-            w1, w2 = words[i], words[j]
+def compute_string_similarity_edges(words: list[str]) -> list[tuple[int, int]]:
+    """
+    レーベンシュタイン・ジャロ・ウィンクラー類似度がしきい値以上のペアを抽出
+
+    単語を文字列長でバケット化し、長さの比が min_length_ratio() 未満の
+    （しきい値を超え得ない）ペアは比較しない。
+    類似度はrapidfuzzのcdistでC実装・マルチスレッドで一括計算し、
+    メモリ使用量を抑えるため BLOCK_SIZE x BLOCK_SIZE 以下のブロック単位で計算する。
+    """
+    edges = []
+    if len(words) < 2:
+        return edges
+
+    # 文字列長の昇順に並べ替え（インデックスは元のリストのものを保持）
+    order = sorted(range(len(words)), key=lambda i: len(words[i]))
+    sorted_words = [words[i] for i in order]
+    lengths = [len(w) for w in sorted_words]
+    original_index = np.array(order)
+    ratio = min_length_ratio()
+
+    row_start = 0
+    while row_start < len(sorted_words):
+        # 同じ長さの単語を行ブロックとする
+        length = lengths[row_start]
+        row_end = min(bisect_right(lengths, length), row_start + BLOCK_SIZE)
+        row_words = sorted_words[row_start:row_end]
+
+        # 比較対象は自分以降（長さが同じか長い）で、長さの比がratio以上の単語のみ
+        col_limit = len(lengths) if ratio == 0 else bisect_right(lengths, length / ratio)
+
+        for col_start in range(row_start, col_limit, BLOCK_SIZE):
+            col_end = min(col_start + BLOCK_SIZE, col_limit)
+            col_words = sorted_words[col_start:col_end]
+
+            lev = process.cdist(
+                row_words,
+                col_words,
+                scorer=Levenshtein.normalized_similarity,
+                score_cutoff=LEVENSHTEIN_THRESHOLD,
+                dtype=np.float64,
+                workers=-1,
+            )
+            jw = process.cdist(
+                row_words,
+                col_words,
+                scorer=JaroWinkler.similarity,
+                score_cutoff=JARO_WINKLER_THRESHOLD,
+                dtype=np.float64,
+                workers=-1,
+            )
+            mask = (lev >= LEVENSHTEIN_THRESHOLD) | (jw >= JARO_WINKLER_THRESHOLD)
+            del lev, jw
+
+            # 並べ替え後の位置で i < j のペアのみ
+            i_idx, j_idx = np.nonzero(mask)
+            i_idx += row_start
+            j_idx += col_start
+            upper = i_idx < j_idx
+            edges.extend(
+                zip(
+                    original_index[i_idx[upper]].tolist(),
+                    original_index[j_idx[upper]].tolist(),
+                )
+            )
+
+        row_start = row_end
+
+    return edges
 
-            # レーベンシュタイン類似度
-            lev_sim = normalized_levenshtein(w1, w2)
 
-            # ジャロ・ウィンクラー類似度
-            jw_sim = jaro_winkler_similarity(w1, w2)
+def build_similarity_graph(words: list[str]) -> nx.Graph:
+    """類似度に基づいてグラフを構築"""
+    graph = nx.Graph()
+    graph.add_nodes_from(range(len(words)))
 
-            # N-gramコサイン類似度
-            ng_sim = ngram_sim.get((i, j), 0.0)
+    # レーベンシュタイン類似度・ジャロ・ウィンクラー類似度
+    graph.add_edges_from(compute_string_similarity_edges(words))
 
-            # いずれかのしきい値を超えたらエッジを追加
-            if (
-                lev_sim >= LEVENSHTEIN_THRESHOLD
-                or jw_sim >= JARO_WINKLER_THRESHOLD
-                or ng_sim >= NGRAM_COSINE_THRESHOLD
-            ):
-                graph.add_edge(i, j)
+    # N-gramコサイン類似度
+    graph.add_edges_from(compute_ngram_similarity_edges(words))
 
     return graph
 